@@ -1,4 +1,4 @@
--- local formatter = require("utils.formatter")
+local formatter = require("utils.formatter")
 return {
     "stevearc/conform.nvim",
     lazy = false,
@@ -13,6 +13,10 @@ return {
             desc = "Format buffer",
         },
     },
+    config = function(_, opts)
+        require("conform").setup(opts)
+        formatter.setup()
+    end,
     opts = {
         formatters_by_ft = {
             -- oxfmt
@@ -25,19 +29,19 @@ return {
             typescript = { "oxfmt", lsp_format = "never" },
             vue = { "oxfmt", lsp_format = "never" },
             -- typescript = { "oxfmt", "injected", lsp_format = "never", stop_after_first = false },
-            json = { "oxfmt", lsp_format = "never" },
-            jsonc = { "oxfmt", lsp_format = "never" },
+            -- prettierd when the project has a prettier config, oxfmt otherwise
+            json = formatter.json,
+            jsonc = formatter.jsonc,
             yaml = { "oxfmt", lsp_format = "never" },
             toml = { "oxfmt", lsp_format = "never" },
 
-            -- prettier
-            astro = { "prettier", lsp_format = "never" },
+            -- prettier (prettierd keeps node warm, plain prettier as fallback)
+            astro = { "prettierd", "prettier", stop_after_first = true, lsp_format = "never" },
+            -- svg needs --parser html, which prettierd can't take
             svg = { "prettier", lsp_format = "never", stop_after_first = true },
-            liquid = { "prettier", lsp_format = "fallback" },
+            liquid = { "prettierd", "prettier", stop_after_first = true, lsp_format = "fallback" },
             -- javascript = { "prettier", lsp_format = "never" },
             -- typescript = { "prettier", "injected", lsp_format = "never", stop_after_first = false },
-            -- json = formatter.json,
-            -- jsonc = formatter.jsonc,
 
             -- other
             lua = { "stylua" },
@@ -50,11 +54,10 @@ return {
         -- makes sure the first formatter that works stops
         -- stop_after_first = true,
         -- this creates an autocmd for buwritepre
-        format_on_save = {
-            -- These options will be passed to conform.format()
-            timeout_ms = 2000,
-            -- lsp_format = "fallback",
-        },
+        -- prettierd filetypes format async after save, the rest sync before it
+        -- :FormatStats shows latency per filetype
+        format_on_save = formatter.format_on_save,
+        format_after_save = formatter.format_after_save,
         -- customize formatters
         formatters = {
             -- oxfmt = {
@@ -6,6 +6,7 @@ return {
             ensure_installed = {
                 "markuplint", -- HTML/Liquid linter
                 "prettier", -- JS/TS formatter
+                "prettierd", -- prettier daemon, used on save
                 "stylua", -- Lua formatter
                 "isort", -- for python
                 "black", -- python formatter
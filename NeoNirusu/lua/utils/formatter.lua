@@ -1,47 +1,90 @@
+-- utils/formatter.lua
+-- Formatter selection + save hooks for conform.nvim.
+-- Prettier runs through prettierd (long-lived daemon), so saves don't pay Node start-up.
 local M = {}
 
+local prettier_configs = {
+    ".prettierrc",
+    ".prettierrc.json",
+    ".prettierrc.yml",
+    ".prettierrc.yaml",
+    ".prettierrc.js",
+    ".prettierrc.cjs",
+    ".prettierrc.mjs",
+    "prettier.config.js",
+    "prettier.config.cjs",
+    "prettier.config.mjs",
+    "prettier.config.ts",
+}
+
+-- directory -> config path found (or false), so we only walk up once per folder
+local config_cache = {}
+
+-- bufnr -> formatter names resolved in format_on_save, reused after the write
+local resolved = {}
+
+-- filetype -> { count, total, max, last, errors, timeouts } in ms
+local stats = {}
+
 local function has_prettier_config(bufnr)
-    print("checking buffer", bufnr)
-    local filename = vim.api.nvim_buf_get_name(bufnr)
-
-    vim.print(filename)
-
-    return false
-
-    -- local root = vim.fn.getcwd()
-    --
-    -- local prettier_configs = {
-    --     ".prettierrc",
-    --     ".prettierrc.json",
-    --     ".prettierrc.yml",
-    --     ".prettierrc.yaml",
-    --     ".prettierrc.js",
-    --     ".prettierrc.cjs",
-    --     ".prettierrc.mjs",
-    --     "prettier.config.js",
-    --     "prettier.config.cjs",
-    --     "prettier.config.mjs",
-    --     "prettier.config.ts",
-    -- }
-    --
-    -- for _, file in ipairs(prettier_configs) do
-    --     local path = root .. "/" .. file
-    --
-    --     if vim.uv.fs_stat(path) then
-    --         vim.print("Found:", path)
-    --         return true
-    --     end
-    -- end
-    --
-    -- vim.print("No Prettier config found")
-    -- return false
+    local dir = vim.fs.dirname(vim.api.nvim_buf_get_name(bufnr))
+    if dir == "" or dir == "." then
+        dir = vim.fn.getcwd()
+    end
+    local cached = config_cache[dir]
+    -- config deleted behind our back (git checkout, other editor) -> look again
+    if cached and not vim.uv.fs_stat(cached) then
+        cached = nil
+    end
+    if cached == nil then
+        -- same lookup prettier does: nearest config walking up from the file
+        local found = vim.fs.find(prettier_configs, { upward = true, path = dir, limit = 1 })
+        cached = found[1] or false
+        config_cache[dir] = cached
+    end
+    return cached ~= false
 end
 
-function M.json(bufnr)
-    print("json()", bufnr)
+-- Formatter names conform will run for this buffer (empty when it falls back to LSP or nothing)
+local function formatters_for(bufnr)
+    local names = {}
+    for _, formatter in ipairs(require("conform").list_formatters_to_run(bufnr)) do
+        table.insert(names, formatter.name)
+    end
+    return names
+end
 
+-- Returns the on_format callback that records latency for this save
+local function recorder(bufnr, formatters)
+    local filetype = vim.bo[bufnr].filetype
+    local ran = #formatters > 0
+    local started = vim.uv.hrtime()
+
+    return function(err)
+        if not ran then
+            return
+        end
+        local s = stats[filetype] or { count = 0, total = 0, max = 0, errors = 0, timeouts = 0 }
+        stats[filetype] = s
+        if err then
+            if err:match("timeout$") then
+                s.timeouts = s.timeouts + 1
+            else
+                s.errors = s.errors + 1
+            end
+            return
+        end
+        local ms = (vim.uv.hrtime() - started) / 1e6
+        s.count = s.count + 1
+        s.total = s.total + ms
+        s.max = math.max(s.max, ms)
+        s.last = ms
+    end
+end
+
+function M.json(bufnr)
     if has_prettier_config(bufnr) then
-        return { "prettier", lsp_format = "never" }
+        return { "prettierd", "prettier", stop_after_first = true, lsp_format = "never" }
     end
 
     return { "oxfmt", lsp_format = "never" }
@@ -51,20 +94,67 @@ function M.jsonc(bufnr)
     return M.json(bufnr)
 end
 
--- function M.json()
---     if has_prettier_config() then
---         return { "prettier", lsp_format = "never" }
---     end
---
---     return { "oxfmt", lsp_format = "never" }
--- end
---
--- function M.jsonc()
---     return M.json()
--- end
---
--- function M.css()
---     return { "prettier", lsp_format = "never" }
--- end
+-- Everything except prettierd: sync format before the write
+function M.format_on_save(bufnr)
+    local formatters = formatters_for(bufnr)
+    resolved[bufnr] = formatters
+    if vim.tbl_contains(formatters, "prettierd") then
+        return
+    end
+
+    return { timeout_ms = 2000 }, recorder(bufnr, formatters)
+end
+
+-- prettierd: async after the write, so a cold daemon never blocks or skips a save
+function M.format_after_save(bufnr)
+    local formatters = resolved[bufnr] or formatters_for(bufnr)
+    resolved[bufnr] = nil
+    if not vim.tbl_contains(formatters, "prettierd") then
+        return
+    end
+
+    return { timeout_ms = 5000 }, recorder(bufnr, formatters)
+end
+
+function M.setup()
+    -- config may have changed -> look it up again next save
+    local group = vim.api.nvim_create_augroup("formatter-config-cache", { clear = true })
+    vim.api.nvim_create_autocmd("BufWritePost", {
+        group = group,
+        pattern = prettier_configs,
+        callback = function()
+            config_cache = {}
+        end,
+    })
+    -- added outside nvim (git pull, scaffolding, another editor)
+    vim.api.nvim_create_autocmd({ "FocusGained", "DirChanged" }, {
+        group = group,
+        callback = function()
+            config_cache = {}
+        end,
+    })
+
+    vim.api.nvim_create_user_command("FormatStats", function()
+        local lines = {}
+        for filetype, s in pairs(stats) do
+            local avg = s.count > 0 and s.total / s.count or 0
+            table.insert(
+                lines,
+                string.format(
+                    "%-12s %4d calls  avg %6.1fms  max %6.1fms  last %6.1fms  %d errors  %d timeouts",
+                    filetype,
+                    s.count,
+                    avg,
+                    s.max,
+                    s.last or 0,
+                    s.errors,
+                    s.timeouts
+                )
+            )
+        end
+        table.sort(lines)
+        vim.notify(#lines > 0 and table.concat(lines, "\n") or "No formats yet", vim.log.levels.INFO)
+    end, { desc = "Show format-on-save latency per filetype" })
+end
 
 return M
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""Content-addressed store for Karabiner automatic backups.
+
+Karabiner drops a full copy of karabiner.json into automatic_backups/ on every
+edit. This folds those copies into a small store instead:
+
+- every backup is canonicalized (sorted keys) and hashed, identical content is
+  stored once no matter how many dates point at it
+- the newest version and every KEYFRAME-th version before it are kept as
+  full snapshots, the rest as reverse structural diffs against the next
+  newer version
+- index.json maps each backup date to its content hash
+
+Usage:
+    store.py ingest [--prune-raw] [--retain] [FILES...]
+    store.py list
+    store.py show DATE
+    store.py diff DATE DATE
+    store.py retain [--keep-days N]
+"""
+
+import argparse
+import copy
+import datetime
+import difflib
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+
+STORE_DIR = Path(__file__).resolve().parent
+DOTFILES = STORE_DIR.parent
+RAW_DIR = DOTFILES / "karabiner" / "automatic_backups"
+INDEX = STORE_DIR / "index.json"
+OBJECTS = STORE_DIR / "objects"
+DELTAS = STORE_DIR / "deltas"
+
+# Max length of a delta chain before a full snapshot is stored again
+KEYFRAME = 8
+# Retention: keep everything this recent, older months keep their newest backup
+KEEP_DAYS = 180
+
+BACKUP_NAME = re.compile(r"karabiner_(\d{8})\.json$")
+DATE = re.compile(r"^\d{8}$")
+
+
+def canonical(doc):
+    return json.dumps(
+        doc, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+
+
+def content_hash(doc):
+    return hashlib.sha256(canonical(doc).encode()).hexdigest()
+
+
+def write_json(path, doc):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    text = json.dumps(doc, sort_keys=True, indent=2, ensure_ascii=False) + "\n"
+    if not path.exists() or path.read_text() != text:
+        path.write_text(text)
+
+
+# --- structural diff ---------------------------------------------------------
+
+
+def diff(old, new, path=()):
+    """Return ops that turn `old` into `new` when applied in order."""
+    if type(old) is not type(new):
+        return [{"op": "set", "path": list(path), "value": new}]
+
+    if isinstance(old, dict):
+        ops = []
+        for key in sorted(old.keys() - new.keys()):
+            ops.append({"op": "del", "path": [*path, key]})
+        for key in sorted(new.keys() - old.keys()):
+            ops.append({"op": "set", "path": [*path, key], "value": new[key]})
+        for key in sorted(old.keys() & new.keys()):
+            ops.extend(diff(old[key], new[key], (*path, key)))
+        return ops
+
+    if isinstance(old, list):
+        matcher = difflib.SequenceMatcher(
+            None,
+            [canonical(x) for x in old],
+            [canonical(x) for x in new],
+            autojunk=False,
+        )
+        ops = []
+        # Walk back to front so earlier indices stay valid while applying
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == "equal":
+                continue
+            if tag == "replace" and i2 - i1 == j2 - j1:
+                for offset in range(i2 - i1):
+                    at = i1 + offset
+                    ops.extend(diff(old[at], new[j1 + offset], (*path, at)))
+            else:
+                ops.append(
+                    {
+                        "op": "splice",
+                        "path": list(path),
+                        "start": i1,
+                        "end": i2,
+                        "value": new[j1:j2],
+                    }
+                )
+        return ops
+
+    if old != new:
+        return [{"op": "set", "path": list(path), "value": new}]
+    return []
+
+
+def patch(doc, ops):
+    for op in ops:
+        path = op["path"]
+        if op["op"] == "splice":
+            target = doc
+            for key in path:
+                target = target[key]
+            target[op["start"] : op["end"]] = op["value"]
+            continue
+        if not path:
+            doc = op["value"]
+            continue
+        parent = doc
+        for key in path[:-1]:
+            parent = parent[key]
+        if op["op"] == "del":
+            del parent[path[-1]]
+        else:
+            parent[path[-1]] = op["value"]
+    return doc
+
+
+# --- store -------------------------------------------------------------------
+
+
+def load_index():
+    if INDEX.exists():
+        return json.loads(INDEX.read_text())
+    return {"versions": {}}
+
+
+def ordered_hashes(index):
+    """Distinct hashes, oldest first by the latest date pointing at them.
+
+    Content that comes back after a revert (A, B, A) sorts as the newest.
+    """
+    latest = {}
+    for date in sorted(index["versions"]):
+        latest[index["versions"][date]] = date
+    return sorted(latest, key=latest.get)
+
+
+def reconstruct(digest):
+    chain = []
+    while not (OBJECTS / f"{digest}.json").exists():
+        delta = json.loads((DELTAS / f"{digest}.json").read_text())
+        chain.append(delta["ops"])
+        digest = delta["base"]
+    doc = json.loads((OBJECTS / f"{digest}.json").read_text())
+    for ops in reversed(chain):
+        doc = patch(doc, ops)
+    return doc
+
+
+def save(index, docs):
+    """Rewrite objects/deltas for the hashes in `index`.
+
+    `docs` maps hash -> document for everything referenced. Output is
+    deterministic, so unchanged versions produce byte-identical files.
+    """
+    hashes = ordered_hashes(index)
+
+    # Count from the newest version, so retiring old versions leaves the
+    # remaining files untouched
+    for position, digest in enumerate(reversed(hashes)):
+        if position % KEYFRAME == 0:
+            write_json(OBJECTS / f"{digest}.json", docs[digest])
+            (DELTAS / f"{digest}.json").unlink(missing_ok=True)
+        else:
+            base = hashes[len(hashes) - position]
+            ops = diff(docs[base], docs[digest])
+            rebuilt = patch(copy.deepcopy(docs[base]), ops)
+            if content_hash(rebuilt) != digest:
+                # Never trust a delta that doesn't round-trip
+                print(f"  diff mismatch for {digest[:12]}, storing in full")
+                write_json(OBJECTS / f"{digest}.json", docs[digest])
+                (DELTAS / f"{digest}.json").unlink(missing_ok=True)
+                continue
+            write_json(DELTAS / f"{digest}.json", {"base": base, "ops": ops})
+            (OBJECTS / f"{digest}.json").unlink(missing_ok=True)
+
+    # Drop anything no longer referenced
+    for folder in (OBJECTS, DELTAS):
+        for path in folder.glob("*.json") if folder.exists() else []:
+            if path.stem not in hashes:
+                path.unlink()
+
+    write_json(INDEX, index)
+
+
+def load_all(index):
+    return {digest: reconstruct(digest) for digest in ordered_hashes(index)}
+
+
+def resolve_date(index, date):
+    """Exact date, or the newest backup taken on/before it."""
+    dates = [d for d in sorted(index["versions"]) if d <= date]
+    if not dates:
+        sys.exit(f"No backup on or before {date}")
+    return dates[-1]
+
+
+def retain(index, keep_days=KEEP_DAYS, today=None):
+    today = today or datetime.date.today()
+    cutoff = (today - datetime.timedelta(days=keep_days)).strftime("%Y%m%d")
+    newest_per_month = {}
+    for date in sorted(index["versions"]):
+        if date < cutoff:
+            newest_per_month[date[:6]] = date
+    kept = {
+        date: digest
+        for date, digest in index["versions"].items()
+        if date >= cutoff or newest_per_month[date[:6]] == date
+    }
+    dropped = sorted(index["versions"].keys() - kept.keys())
+    index["versions"] = dict(sorted(kept.items()))
+    return dropped
+
+
+# --- commands ----------------------------------------------------------------
+
+
+def cmd_ingest(args):
+    index = load_index()
+    docs = load_all(index)
+    files = [Path(f) for f in args.files]
+    files = files or sorted(RAW_DIR.glob("karabiner_*.json"))
+
+    ingested = {}
+    for path in files:
+        match = BACKUP_NAME.search(path.name)
+        if not match:
+            print(f"  skipping {path} (expected karabiner_YYYYMMDD.json)")
+            continue
+        doc = json.loads(path.read_text())
+        digest = content_hash(doc)
+        docs[digest] = doc
+        index["versions"][match.group(1)] = digest
+        ingested[path] = (match.group(1), digest)
+    index["versions"] = dict(sorted(index["versions"].items()))
+
+    if args.retain:
+        for date in retain(index):
+            print(f"  retired {date}")
+
+    save(index, docs)
+    distinct = len(ordered_hashes(index))
+    print(
+        f"✔ Ingested {len(ingested)} backup(s), "
+        f"{distinct} distinct version(s) stored"
+    )
+
+    if args.prune_raw:
+        for path, (date, digest) in ingested.items():
+            stored = index["versions"].get(date)
+            # Retired dates go anyway, everything else must rebuild exactly
+            if stored is not None and (
+                stored != digest or content_hash(reconstruct(stored)) != digest
+            ):
+                print(f"  keeping {path}: stored copy doesn't match")
+                continue
+            path.unlink()
+
+
+def cmd_list(args):
+    index = load_index()
+    for date, digest in index["versions"].items():
+        kind = "full" if (OBJECTS / f"{digest}.json").exists() else "delta"
+        print(f"{date}  {digest[:12]}  {kind}")
+
+
+def cmd_show(args):
+    index = load_index()
+    date = resolve_date(index, args.date)
+    doc = reconstruct(index["versions"][date])
+    print(json.dumps(doc, indent=4, ensure_ascii=False))
+
+
+def cmd_diff(args):
+    index = load_index()
+    old = reconstruct(index["versions"][resolve_date(index, args.old)])
+    new = reconstruct(index["versions"][resolve_date(index, args.new)])
+    print(json.dumps(diff(old, new), indent=4, ensure_ascii=False))
+
+
+def cmd_retain(args):
+    index = load_index()
+    docs = load_all(index)
+    dropped = retain(index, args.keep_days)
+    save(index, docs)
+    print(f"✔ Retired {len(dropped)} backup(s): {' '.join(dropped) or '-'}")
+
+
+def backup_date(value):
+    if not DATE.match(value):
+        raise argparse.ArgumentTypeError(f"{value!r} is not a YYYYMMDD date")
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Deduplicated store for Karabiner automatic backups"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="add automatic backups to the store")
+    ingest.add_argument(
+        "files", nargs="*", help=f"backup files (default: {RAW_DIR})"
+    )
+    ingest.add_argument(
+        "--prune-raw",
+        action="store_true",
+        help="delete raw backups once stored",
+    )
+    ingest.add_argument(
+        "--retain",
+        action="store_true",
+        help="apply the retention policy afterwards",
+    )
+    ingest.set_defaults(func=cmd_ingest)
+
+    sub.add_parser("list", help="list stored backup dates").set_defaults(
+        func=cmd_list
+    )
+
+    show = sub.add_parser("show", help="print the backup from DATE (YYYYMMDD)")
+    show.add_argument("date", type=backup_date)
+    show.set_defaults(func=cmd_show)
+
+    diff_cmd = sub.add_parser("diff", help="structural diff between two dates")
+    diff_cmd.add_argument("old", type=backup_date)
+    diff_cmd.add_argument("new", type=backup_date)
+    diff_cmd.set_defaults(func=cmd_diff)
+
+    retain_cmd = sub.add_parser("retain", help="apply the retention policy")
+    retain_cmd.add_argument("--keep-days", type=int, default=KEEP_DAYS)
+    retain_cmd.set_defaults(func=cmd_retain)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Round-trip checks for store.py.
+
+Run: python3 karabiner_backups/test_store.py
+"""
+
+import argparse
+import copy
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import store
+
+CASES = [
+    ({}, {"a": 1}),
+    ({"a": 1, "b": 2}, {"b": 3}),
+    ([1, 2, 3], [0, 1, 3, 4]),
+    ([{"k": 1}, {"k": 2}], [{"k": 1, "x": True}, {"k": 2}]),
+    ({"rules": [1, 2]}, {"rules": "off"}),
+    ([1, [2, [3]]], [[2, [3, 4]], 1]),
+    ("a", ["a"]),
+    (None, {"profiles": []}),
+]
+
+
+def random_doc(rng, depth=0):
+    kind = rng.choice(["dict", "list", "scalar"] if depth < 3 else ["scalar"])
+    if kind == "dict":
+        keys = [rng.choice("abcde") for _ in range(4)]
+        return {key: random_doc(rng, depth + 1) for key in keys}
+    if kind == "list":
+        return [random_doc(rng, depth + 1) for _ in range(rng.randint(0, 5))]
+    return rng.choice([None, True, 0, 1, "x", "y", 1.5])
+
+
+class DiffPatchTest(unittest.TestCase):
+    def assert_round_trip(self, old, new):
+        ops = store.diff(old, new)
+        self.assertEqual(store.patch(copy.deepcopy(old), ops), new)
+
+    def test_cases(self):
+        for old, new in CASES:
+            with self.subTest(old=old, new=new):
+                self.assert_round_trip(old, new)
+                self.assert_round_trip(new, old)
+
+    def test_random(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            self.assert_round_trip(random_doc(rng), random_doc(rng))
+
+
+class StoreTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        for name, value in {
+            "INDEX": self.root / "index.json",
+            "OBJECTS": self.root / "objects",
+            "DELTAS": self.root / "deltas",
+            "RAW_DIR": self.root / "raw",
+        }.items():
+            patcher = mock.patch.object(store, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        store.RAW_DIR.mkdir()
+
+    def write_raw(self, date, doc):
+        path = store.RAW_DIR / f"karabiner_{date}.json"
+        path.write_text(json.dumps(doc))
+        return path
+
+    def ingest(self):
+        args = argparse.Namespace(files=[], prune_raw=True, retain=False)
+        with mock.patch("builtins.print"):
+            store.cmd_ingest(args)
+
+    def test_reconstruct_every_date(self):
+        rng = random.Random(1)
+        docs = {
+            f"202601{day:02d}": {"profiles": [random_doc(rng)], "day": day}
+            for day in range(1, 21)
+        }
+        docs["20260121"] = docs["20260103"]  # revert to older content
+        for date, doc in docs.items():
+            self.write_raw(date, doc)
+        self.ingest()
+
+        index = store.load_index()
+        for date, doc in docs.items():
+            self.assertEqual(store.reconstruct(index["versions"][date]), doc)
+        newest = index["versions"]["20260121"]
+        self.assertTrue((store.OBJECTS / f"{newest}.json").exists())
+        self.assertEqual(list(store.RAW_DIR.iterdir()), [])
+
+    def test_prune_keeps_raw_when_rebuild_differs(self):
+        path = self.write_raw("20260101", {"a": [1, 2]})
+        with mock.patch.object(store, "reconstruct", return_value={"a": [1]}):
+            self.ingest()
+        self.assertTrue(path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()